@@ -0,0 +1,46 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# ------------------------- Initial Configuration -------------------------
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./orders.db")
+# Endpoints async: la concurrencia la da el event loop, no el threadpool de FastAPI.
+# Cada conexion aiosqlite es un hilo propio y SQLite admite un solo escritor a la vez
+# (en WAL los lectores si corren en paralelo), asi que alcanza con pocas conexiones:
+# 5 fijas para lecturas concurrentes y hasta 5 extra en picos. Los escritores que
+# esperan el lock de la DB se resuelven con busy_timeout, no con mas conexiones.
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=5,
+    max_overflow=5,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    query_cache_size=1200,
+    connect_args={"check_same_thread": False},
+)
+
+# PRAGMAs de SQLite: se aplican a cada conexion nueva del pool
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("temp_store", "MEMORY"),
+    ("mmap_size", 134217728),
+    ("cache_size", -20000),
+    ("busy_timeout", 5000),
+    ("foreign_keys", "ON"),
+)
+
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+Base = declarative_base()
+
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
@@ -3,7 +3,6 @@
 import sqlalchemy as sa
 
 engine = sa.create_engine("sqlite:///:memory:")
-connection = engine.connect()
 
 metadata = sa.MetaData()
 
@@ -16,22 +15,29 @@ order_table = sa.Table(
 )
 
 
-def insert_order(product: str, quantity: int) -> None:
-    query = order_table.insert().values(product=product, quantity=quantity)
-    connection.execute(query)
+def insert_orders(rows: list[dict]) -> None:
+    # Sin filas, insert() sin parametros agregaria una orden vacia
+    if not rows:
+        return
+    # Un solo executemany dentro de una unica transaccion
+    with engine.begin() as connection:
+        connection.execute(order_table.insert(), rows)
 
 
 def select_order(id: int) -> sa.engine.Result:
     query = order_table.select().where(order_table.c.id == id)
-    result = connection.execute(query)
-    return result.fetchone()
+    with engine.connect() as connection:
+        result = connection.execute(query)
+        return result.fetchone()
 
 
 def main() -> None:
     metadata.create_all(engine)
-    insert_order("Coca-cola", 3)
+    insert_orders([
+        {"product": "Coca-cola", "quantity": 3},
+        {"product": "Sprite", "quantity": 2},
+    ])
     print(select_order("1"))
-    connection.close()
 
 
 if __name__ == "__main__":
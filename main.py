@@ -1,20 +1,41 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
-from sqlalchemy.orm import relationship, Session
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import Column, Integer, SmallInteger, String, ForeignKey, DateTime, Index
+from sqlalchemy.orm import relationship, selectinload, raiseload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, bindparam, func
 from datetime import datetime
-from pydantic import BaseModel
+from enum import IntEnum
+from pydantic import BaseModel, ConfigDict, TypeAdapter, field_validator
 from typing import List
+from cachetools import TTLCache
+from db import engine, Base, SessionLocal, get_db
 
-# ------------------------- Initial Configuration -------------------------
-DATABASE_URL = "sqlite:///./orders.db"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+# Cache en memoria del catalogo de productos (casi estatico)
+_products_cache = TTLCache(maxsize=1, ttl=60)
 
 # -------------------------  Modelos de tablas DB -------------------------
+class OrderStatus(IntEnum):
+    PENDING = 0
+    IN_PROGRESS = 1
+    DONE = 2
+
+# Etiquetas que expone la API para cada estado guardado en la DB
+STATUS_LABELS = {
+    OrderStatus.PENDING: "pendiente",
+    OrderStatus.IN_PROGRESS: "en proceso",
+    OrderStatus.DONE: "completado",
+}
+STATUS_BY_LABEL = {label: order_status for order_status, label in STATUS_LABELS.items()}
+
+def parse_status(label: str) -> OrderStatus:
+    if label not in STATUS_BY_LABEL:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Valid statuses: {list(STATUS_BY_LABEL)}")
+    return STATUS_BY_LABEL[label]
+
 class Product(Base):
     __tablename__ = "products"
     id = Column(Integer, primary_key=True, index=True)
@@ -25,47 +46,131 @@ class Order(Base):
     __tablename__ = "orders"
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
-    customer_id = Column(Integer, ForeignKey("customers.id"))  # Clave foránea explícita
+    customer_id = Column(Integer, ForeignKey("customers.id"), index=True)  # Clave foránea explícita
     quantity = Column(Integer)
-    status = Column(String, default="pendiente")
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    status = Column(SmallInteger, default=OrderStatus.PENDING)
+    timestamp = Column(DateTime, server_default=func.current_timestamp(), nullable=False)
     product = relationship("Product", back_populates="orders")
     customer = relationship("Customer", back_populates="orders")  # Relación bidireccional
 
+    __table_args__ = (Index("ix_orders_status_timestamp", "status", "timestamp"),)
+
 class Customer(Base):
     __tablename__ = "customers"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True)  # Hacemos el nombre único para simplificar
     orders = relationship("Order", back_populates="customer")
 
-Base.metadata.create_all(bind=engine)
-
-
-# ------------------------- Agregar Productos -------------------------
-def add_sample_products():
-    db = SessionLocal()
+# Consulta de orden por id, construida una sola vez y reutilizada
+GET_ORDER_STMT = (
+    select(Order)
+    .options(selectinload(Order.product), raiseload("*"))
+    .where(Order.id == bindparam("oid"))
+)
+
+def migrate_orders_table(conn):
+    # DBs viejas guardan el estado como texto y/o no tienen default SQL para timestamp:
+    # SQLite no permite alterar columnas, asi que se reconstruye la tabla.
+    # conn debe estar en AUTOCOMMIT: foreign_keys solo se puede cambiar fuera de una transaccion.
+    tables = set(conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars())
+    if "orders_old" in tables:
+        raise RuntimeError("orders.db contiene la tabla orders_old de una migracion interrumpida; revisarla antes de iniciar")
+
+    columns = {row[1]: row for row in conn.exec_driver_sql("PRAGMA table_info(orders)")}
+    text_status = columns["status"][2].upper() in ("VARCHAR", "TEXT")
+    missing_timestamp_default = columns["timestamp"][4] is None
+    if not (text_status or missing_timestamp_default):
+        return
+
+    known = set(STATUS_BY_LABEL) | {str(int(order_status)) for order_status in OrderStatus}
+    stored = {
+        str(value)
+        for value in conn.exec_driver_sql("SELECT DISTINCT status FROM orders WHERE status IS NOT NULL").scalars()
+    }
+    unknown = stored - known
+    if unknown:
+        raise RuntimeError(f"orders.db contiene estados desconocidos {sorted(unknown)}; corregirlos antes de migrar")
+
+    # Procedimiento de SQLite para reconstruir tablas: todo en una sola transaccion
+    conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
     try:
-        # Check if products already exist
-        existing_products = db.query(Product).count()
-        if existing_products == 0:
-            sample_products = [
-                Product(name="Leche"),
-                Product(name="Cafe"),
-                Product(name="Chocolatada"),
-                Product(name="Agua"),
-                Product(name="Gaseosa")
-            ]
-            db.add_all(sample_products)
-            db.commit()
-            print("Added 5 sample products")
-        else:
-            print(f"Database already contains {existing_products} products")
-    except Exception as e:
-        print(f"Error adding sample products: {e}")
+        conn.exec_driver_sql("BEGIN")
+        try:
+            conn.exec_driver_sql("ALTER TABLE orders RENAME TO orders_old")
+            old_indexes = conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'orders_old' AND sql IS NOT NULL"
+            ).scalars().all()
+            for name in old_indexes:
+                conn.exec_driver_sql(f"DROP INDEX {name}")
+            Order.__table__.create(conn)
+            conn.exec_driver_sql(
+                """
+                INSERT INTO orders (id, product_id, customer_id, quantity, status, timestamp)
+                SELECT id, product_id, customer_id, quantity,
+                       COALESCE(CASE status
+                                    WHEN 'pendiente' THEN 0
+                                    WHEN 'en proceso' THEN 1
+                                    WHEN 'completado' THEN 2
+                                    ELSE CAST(status AS INTEGER)
+                                END, 0),
+                       COALESCE(timestamp, CURRENT_TIMESTAMP)
+                FROM orders_old
+                """
+            )
+            conn.exec_driver_sql("DROP TABLE orders_old")
+            broken = conn.exec_driver_sql("PRAGMA foreign_key_check(orders)").all()
+            if broken:
+                raise RuntimeError(
+                    f"orders.db tiene ordenes con claves foraneas invalidas (ids {sorted(row[1] for row in broken)}); "
+                    "corregirlas antes de migrar"
+                )
+            conn.exec_driver_sql("COMMIT")
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
     finally:
-        db.close()
+        conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+
+def create_indexes(conn):
+    # create_all solo crea indices de tablas nuevas; en DBs existentes hay que agregarlos
+    for index in Order.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    # La migracion maneja su propia transaccion
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.run_sync(migrate_orders_table)
+    async with engine.begin() as conn:
+        await conn.run_sync(create_indexes)
+        # Actualizar estadisticas para que el planificador de SQLite use los indices
+        await conn.exec_driver_sql("ANALYZE")
+
 
-add_sample_products()
+# ------------------------- Agregar Productos -------------------------
+async def add_sample_products():
+    async with SessionLocal() as db:
+        try:
+            # Check if products already exist
+            has_products = await db.scalar(select(Product.id).limit(1)) is not None
+            if not has_products:
+                sample_products = [
+                    Product(name="Leche"),
+                    Product(name="Cafe"),
+                    Product(name="Chocolatada"),
+                    Product(name="Agua"),
+                    Product(name="Gaseosa")
+                ]
+                db.add_all(sample_products)
+                await db.commit()
+                _products_cache.clear()
+                print("Added 5 sample products")
+            else:
+                print("Database already contains products")
+        except Exception as e:
+            print(f"Error adding sample products: {e}")
 
 # ------------------------- Pydantic Models -------------------------
 class CustomerBase(BaseModel):
@@ -76,8 +181,7 @@ class CustomerCreate(CustomerBase):
 
 class CustomerOut(CustomerBase):
     id: int
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ProductBase(BaseModel):
@@ -88,8 +192,7 @@ class ProductCreate(ProductBase):
 
 class ProductOut(ProductBase):
     id: int
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class OrderStatusUpdate(BaseModel):
     status: str
@@ -107,119 +210,153 @@ class OrderOut(BaseModel):
     timestamp: datetime
     product: ProductOut
 
-    class Config:
-        from_attributes = True
+    @field_validator("status", mode="before")
+    @classmethod
+    def status_label(cls, value):
+        if isinstance(value, str) and value in STATUS_BY_LABEL:
+            return value
+        return STATUS_LABELS[OrderStatus(value)]
+
+    model_config = ConfigDict(from_attributes=True)
+
+# Adaptadores de las listas, construidos una sola vez en vez de en cada respuesta
+_orders_adapter = TypeAdapter(List[OrderOut])
+_products_adapter = TypeAdapter(List[ProductOut])
+
+def dump(adapter: TypeAdapter, rows) -> list:
+    # Valida las filas ORM y las serializa a tipos JSON
+    return adapter.dump_python(adapter.validate_python(rows), mode="json")
 
 # ------------------------- FastAPI Application -------------------------
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    # Los productos de ejemplo solo se cargan si se pide explicitamente
+    if os.getenv("SEED_DB", "").lower() in ("1", "true", "yes"):
+        await add_sample_products()
+    yield
+    await engine.dispose()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # API Routes
 
 @app.get("/", status_code=status.HTTP_200_OK)
-def welcome():
+async def welcome():
     text = """Bienvenido...           '/orders/' para ver todas las ordenes           '/orders/{num}' para ver orden en especifico"""
     return text
 
 # Get all orders
-@app.get("/orders/", response_model=List[OrderOut], status_code=status.HTTP_200_OK)
-def get_orders(db: Session = Depends(get_db)):
-    orders = db.query(Order).all()
-    return orders
+@app.get("/orders/", responses={200: {"model": List[OrderOut]}}, status_code=status.HTTP_200_OK)
+async def get_orders(db: AsyncSession = Depends(get_db)):
+    result = await db.scalars(select(Order).options(selectinload(Order.product), raiseload("*")))
+    return ORJSONResponse(dump(_orders_adapter, result.all()))
 
 # Get all products - FIXED: Using ProductOut instead of Product
-@app.get("/products/", response_model=List[ProductOut], status_code=status.HTTP_200_OK)
-def get_products(db: Session = Depends(get_db)):
-    products = db.query(Product).all()
-    return products
+@app.get("/products/", responses={200: {"model": List[ProductOut]}}, status_code=status.HTTP_200_OK)
+async def get_products(db: AsyncSession = Depends(get_db)):
+    products = _products_cache.get("products")
+    if products is None:
+        result = await db.scalars(select(Product))
+        products = dump(_products_adapter, result.all())
+        _products_cache["products"] = products
+    return ORJSONResponse(products)
 
 # Get specific order
 @app.get("/orders/{order_id}", response_model=OrderOut, status_code=status.HTTP_200_OK)
-def get_order(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+async def get_order(order_id: int, db: AsyncSession = Depends(get_db)):
+    order = await db.scalar(GET_ORDER_STMT, {"oid": order_id})
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
-@app.post("/orders/", response_model=List[OrderOut], status_code=status.HTTP_201_CREATED)
-def create_orders(orders: List[OrderCreate], customer_name: str, db: Session = Depends(get_db)):
-    # Verificar si el cliente existe o crearlo
-    customer = db.query(Customer).filter(Customer.name == customer_name).first()
-    if not customer:
-        customer = Customer(name=customer_name)
-        db.add(customer)
-        db.commit()
-        db.refresh(customer)
-    
-    db_orders = []
-    for order in orders:
-        if not db.query(Product).filter(Product.id == order.product_id).first():
-            raise HTTPException(status_code=400, detail=f"Producto ID {order.product_id} no existe")   
-        db_order = Order(
-            product_id=order.product_id,
-            customer_id=customer.id,
-            quantity=order.quantity,
-            status=order.status
+@app.post("/orders/", responses={201: {"model": List[OrderOut]}}, status_code=status.HTTP_201_CREATED)
+async def create_orders(orders: List[OrderCreate], customer_name: str, db: AsyncSession = Depends(get_db)):
+    # Carrito vacio: no hay nada que insertar
+    if not orders:
+        return ORJSONResponse([], status_code=status.HTTP_201_CREATED)
+
+    # Cliente y ordenes se confirman juntos en una sola transaccion
+    async with db.begin():
+        statuses = [parse_status(order.status) for order in orders]
+
+        # Validar todos los productos con una sola consulta
+        product_ids = {order.product_id for order in orders}
+        found_ids = set(await db.scalars(select(Product.id).where(Product.id.in_(product_ids))))
+        missing_ids = product_ids - found_ids
+        if missing_ids:
+            raise HTTPException(status_code=400, detail=f"Producto IDs {sorted(missing_ids)} no existen")
+
+        # Obtener o crear el cliente en un solo upsert
+        upsert_customer = (
+            sqlite_insert(Customer)
+            .values(name=customer_name)
+            .on_conflict_do_update(index_elements=["name"], set_={"name": customer_name})
+            .returning(Customer.id)
         )
-        db.add(db_order)
-        db_orders.append(db_order)
-    db.commit()
-    for order in db_orders:
-        db.refresh(order)
-    return db_orders
+        customer_id = (await db.execute(upsert_customer)).scalar_one()
+
+        # Insertar todas las ordenes en un solo INSERT ... RETURNING
+        rows = [
+            {
+                "product_id": order.product_id,
+                "customer_id": customer_id,
+                "quantity": order.quantity,
+                "status": order_status,
+            }
+            for order, order_status in zip(orders, statuses)
+        ]
+        stmt = insert(Order).returning(Order, sort_by_parameter_order=True).options(selectinload(Order.product))
+        db_orders = (await db.scalars(stmt, rows)).all()
+    return ORJSONResponse(dump(_orders_adapter, db_orders), status_code=status.HTTP_201_CREATED)
 
 # Ver el estado de una orden
 @app.get("/orders/{order_id}/status/", response_model=OrderOut, status_code=status.HTTP_200_OK)
-def get_order_status(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+async def get_order_status(order_id: int, db: AsyncSession = Depends(get_db)):
+    order = await db.scalar(GET_ORDER_STMT, {"oid": order_id})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
 # Actualizar el estado de una orden
 @app.put("/orders/{order_id}/status/", response_model=OrderOut, status_code=status.HTTP_202_ACCEPTED)
-def update_order_status(order_id: int, status_update: OrderStatusUpdate, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+async def update_order_status(order_id: int, status_update: OrderStatusUpdate, db: AsyncSession = Depends(get_db)):
+    order = await db.scalar(GET_ORDER_STMT, {"oid": order_id})
     if order is None: #VERIFICACION SI ORDEN EXISTE
         raise HTTPException(status_code=404, detail="Order not found")
-    valid_statuses = ["pendiente", "en proceso", "completado"]
-    if status_update.status not in valid_statuses:
-        raise HTTPException(status_code=400, detail=f"Invalid status. Valid statuses: {valid_statuses}")
-    order.status = status_update.status
-    db.commit()
-    db.refresh(order)
+    order.status = parse_status(status_update.status)
+    await db.commit()
     return order
 
 
 # Crear o obtener un cliente por nombre
 @app.post("/customers/", response_model=CustomerOut, status_code=status.HTTP_201_CREATED)
-def create_customer(customer: CustomerCreate, db: Session = Depends(get_db)):
+async def create_customer(customer: CustomerCreate, db: AsyncSession = Depends(get_db)):
     # Verificar si el cliente ya existe
-    existing_customer = db.query(Customer).filter(Customer.name == customer.name).first()
-    if existing_customer:
-        return existing_customer
+    existing_id = await db.scalar(select(Customer.id).where(Customer.name == customer.name).limit(1))
+    if existing_id is not None:
+        return CustomerOut(id=existing_id, name=customer.name)
     
     db_customer = Customer(**customer.model_dump())
     db.add(db_customer)
-    db.commit()
-    db.refresh(db_customer)
+    await db.commit()
     return db_customer
 
 # Obtener historial de pedidos de un cliente por nombre
-@app.get("/customers/{customer_name}/orders/", response_model=List[OrderOut], status_code=status.HTTP_200_OK)
-def get_customer_orders(customer_name: str, db: Session = Depends(get_db)):
+@app.get("/customers/{customer_name}/orders/", responses={200: {"model": List[OrderOut]}}, status_code=status.HTTP_200_OK)
+async def get_customer_orders(customer_name: str, db: AsyncSession = Depends(get_db)):
     # Verificar si el cliente existe
-    customer = db.query(Customer).filter(Customer.name == customer_name).first()
-    if not customer:
+    customer_id = await db.scalar(select(Customer.id).where(Customer.name == customer_name).limit(1))
+    if customer_id is None:
         raise HTTPException(status_code=404, detail="Customer not found")
     
     # Obtener todas las órdenes del cliente
-    orders = db.query(Order).filter(Order.customer_id == customer.id).all()
-    return orders
+    result = await db.scalars(
+        select(Order)
+        .options(selectinload(Order.product), raiseload("*"))
+        .where(Order.customer_id == customer_id)
+    )
+    return ORJSONResponse(dump(_orders_adapter, result.all()))
+
+
 
@@ -0,0 +1,219 @@
+import os
+import tempfile
+
+# La DB de los tests vive fuera del repo; debe definirse antes de importar main
+DB_PATH = os.path.join(tempfile.mkdtemp(), "orders.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+os.environ["SEED_DB"] = "1"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+
+import db
+import main
+
+
+@pytest.fixture
+def fresh_db():
+    main._products_cache.clear()
+    yield
+    # El lifespan ya cerro el pool: cada test arranca con una DB nueva
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(DB_PATH + suffix):
+            os.remove(DB_PATH + suffix)
+
+
+@pytest.fixture
+def client(fresh_db):
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("value", ["0", "false", "no", ""])
+def test_seed_db_requires_true_value(fresh_db, monkeypatch, value):
+    monkeypatch.setenv("SEED_DB", value)
+    with TestClient(main.app) as client:
+        assert client.get("/products/").json() == []
+
+
+def test_create_orders_empty_cart(client):
+    response = client.post("/orders/?customer_name=ana", json=[])
+    assert response.status_code == 201
+    assert response.json() == []
+
+    # Un carrito vacio no debe guardar ninguna orden
+    response = client.get("/orders/")
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_create_orders_keeps_request_order(client):
+    product_ids = [5, 1, 4, 2, 3]
+    response = client.post(
+        "/orders/?customer_name=ana",
+        json=[{"product_id": product_id, "quantity": 1} for product_id in product_ids],
+    )
+    assert response.status_code == 201
+    assert [order["product_id"] for order in response.json()] == product_ids
+
+
+
+def test_create_orders_missing_products_writes_nothing(client):
+    response = client.post(
+        "/orders/?customer_name=ana",
+        json=[
+            {"product_id": 1, "quantity": 1},
+            {"product_id": 99, "quantity": 1},
+            {"product_id": 98, "quantity": 1},
+        ],
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Producto IDs [98, 99] no existen"}
+
+    assert client.get("/orders/").json() == []
+    assert client.get("/customers/ana/orders/").status_code == 404
+
+
+def test_get_products_is_cached(client):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine.sync_engine, "before_cursor_execute", record)
+    try:
+        first = client.get("/products/")
+        queries_after_first = len(statements)
+        second = client.get("/products/")
+    finally:
+        event.remove(db.engine.sync_engine, "before_cursor_execute", record)
+
+    assert first.status_code == second.status_code == 200
+    assert len(first.json()) == 5
+    assert second.json() == first.json()
+    assert queries_after_first == 1
+    assert len(statements) == queries_after_first
+
+
+def test_create_orders_reuses_customer(client):
+    first = client.post("/orders/?customer_name=ana", json=[{"product_id": 1, "quantity": 2}])
+    second = client.post("/orders/?customer_name=ana", json=[{"product_id": 2, "quantity": 1}])
+    assert first.status_code == second.status_code == 201
+
+    response = client.get("/customers/ana/orders/")
+    assert response.status_code == 200
+    assert [order["product_id"] for order in response.json()] == [1, 2]
+
+    # El upsert no duplica al cliente
+    customer = client.post("/customers/", json={"name": "ana"}).json()
+    assert customer["id"] == 1
+
+# Esquema de orders.db tal como lo creaba la primera version de la app
+LEGACY_SCHEMA = """
+CREATE TABLE products (id INTEGER NOT NULL, name VARCHAR, PRIMARY KEY (id));
+CREATE INDEX ix_products_id ON products (id);
+CREATE TABLE customers (id INTEGER NOT NULL, name VARCHAR, PRIMARY KEY (id), UNIQUE (name));
+CREATE INDEX ix_customers_id ON customers (id);
+CREATE TABLE orders (
+    id INTEGER NOT NULL,
+    product_id INTEGER,
+    customer_id INTEGER,
+    quantity INTEGER,
+    status VARCHAR,
+    timestamp DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(product_id) REFERENCES products (id),
+    FOREIGN KEY(customer_id) REFERENCES customers (id)
+);
+CREATE INDEX ix_orders_id ON orders (id);
+"""
+
+
+@pytest.fixture
+def legacy_conn(tmp_path):
+    # Mismos PRAGMAs que db.py (incluido foreign_keys=ON) y autocommit como en init_db
+    engine = create_engine(f"sqlite:///{tmp_path}/orders.db")
+    event.listen(engine, "connect", db.set_sqlite_pragmas)
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        for statement in LEGACY_SCHEMA.split(";"):
+            if statement.strip():
+                conn.exec_driver_sql(statement)
+        yield conn
+    engine.dispose()
+
+
+def test_create_indexes_on_existing_db(legacy_conn):
+    main.create_indexes(legacy_conn)
+    indexes = set(legacy_conn.scalars(text("SELECT name FROM sqlite_master WHERE type = 'index'")))
+    assert {"ix_orders_customer_id", "ix_orders_status_timestamp"} <= indexes
+
+
+def test_migrate_orders_table_maps_status_labels(legacy_conn):
+    legacy_conn.exec_driver_sql("INSERT INTO products (id, name) VALUES (1, 'Leche')")
+    legacy_conn.exec_driver_sql("INSERT INTO customers (id, name) VALUES (1, 'ana')")
+    legacy_conn.exec_driver_sql(
+        "INSERT INTO orders (id, product_id, customer_id, quantity, status, timestamp) VALUES "
+        "(1, 1, 1, 2, 'pendiente', '2025-03-01 10:00:00'), "
+        "(2, 1, 1, 1, 'completado', '2025-03-01 11:00:00')"
+    )
+
+    main.migrate_orders_table(legacy_conn)
+
+    rows = legacy_conn.exec_driver_sql("SELECT id, status, typeof(status) FROM orders ORDER BY id").all()
+    assert rows == [(1, 0, "integer"), (2, 2, "integer")]
+
+
+def test_migrate_orders_table_rejects_unknown_status(legacy_conn):
+    legacy_conn.exec_driver_sql("INSERT INTO orders (id, quantity, status) VALUES (1, 1, 'enviado')")
+    with pytest.raises(RuntimeError, match="enviado"):
+        main.migrate_orders_table(legacy_conn)
+
+
+def test_order_out_accepts_status_label():
+    order = main.OrderOut.model_validate({
+        "id": 1,
+        "product_id": 1,
+        "quantity": 1,
+        "status": "en proceso",
+        "timestamp": "2025-03-01T10:00:00",
+        "product": {"id": 1, "name": "Leche"},
+    })
+    assert order.status == "en proceso"
+
+
+def test_migrate_orders_table_adds_timestamp_default(legacy_conn):
+    legacy_conn.exec_driver_sql("INSERT INTO orders (id, quantity, status) VALUES (1, 1, '0')")
+
+    main.migrate_orders_table(legacy_conn)
+
+    assert legacy_conn.exec_driver_sql("SELECT timestamp IS NOT NULL FROM orders").scalar()
+    legacy_conn.exec_driver_sql("INSERT INTO orders (id, quantity, status) VALUES (2, 1, 0)")
+    assert legacy_conn.exec_driver_sql("SELECT timestamp IS NOT NULL FROM orders WHERE id = 2").scalar()
+
+
+def test_migrate_orders_table_is_atomic(legacy_conn):
+    legacy_conn.exec_driver_sql("INSERT INTO products (id, name) VALUES (1, 'Leche')")
+    legacy_conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+    legacy_conn.exec_driver_sql(
+        "INSERT INTO orders (id, product_id, quantity, status) VALUES "
+        "(1, 1, 2, 'pendiente'), (2, 99, 1, 'pendiente'), (3, 1, 1, 'completado')"
+    )
+    legacy_conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+
+    with pytest.raises(RuntimeError, match=r"ids \[2\]"):
+        main.migrate_orders_table(legacy_conn)
+
+    # La tabla original queda intacta y sin restos de la migracion
+    tables = set(legacy_conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars())
+    assert "orders_old" not in tables
+    rows = legacy_conn.exec_driver_sql("SELECT id, status FROM orders ORDER BY id").all()
+    assert rows == [(1, "pendiente"), (2, "pendiente"), (3, "completado")]
+    assert legacy_conn.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+
+
+def test_migrate_orders_table_refuses_leftover_orders_old(legacy_conn):
+    legacy_conn.exec_driver_sql("CREATE TABLE orders_old (id INTEGER)")
+    with pytest.raises(RuntimeError, match="orders_old"):
+        main.migrate_orders_table(legacy_conn)